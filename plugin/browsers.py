@@ -1,3 +1,4 @@
+import fnmatch
 import shutil
 import sqlite3
 from tempfile import gettempdir
@@ -18,31 +19,61 @@ OPERA_DIR = Path(ROAMING, 'Opera Software', 'Opera Stable', 'Default', 'History'
 VIVALDI_DIR = Path(LOCAL_DATA, 'Vivaldi', 'User Data', 'Default', 'History')
 ARC_DIR = Path(LOCAL_DATA, 'Packages', 'TheBrowserCompany.Arc_ttt1ap7aakyb4', 'LocalCache', 'Local', 'Arc', 'User Data', 'Default', 'History')
 ZEN_DIR = Path(ROAMING, 'zen', 'Profiles')
+# Seconds between the WebKit epoch (1601-01-01) and the Unix epoch
+CHROMIUM_EPOCH_OFFSET = 11644473600
+# Histories below this row count are cheap enough to scan with LIKE;
+# above it a trigram index pays for its build cost
+FTS_MIN_ROWS = 50000
+# The trigram tokenizer cannot match needles shorter than one trigram
+FTS_MIN_NEEDLE = 3
+# Persisted trigram indexes, one database per browser. Kept in the
+# plugin directory like the favicon cache - not the temp directory,
+# since the index holds history urls and titles.
+FTS_INDEX_DIR = Path(__file__).parent.parent / 'search-index'
 
 def get(browser_name):
     """Get browser instance by name using dictionary dispatch for O(1) lookup"""
-    browsers = {
-        'chrome': Chrome,
-        'firefox': Firefox,
-        'edge': Edge,
-        'brave': Brave,
-        'opera': Opera,
-        'vivaldi': Vivaldi,
-        'arc': Arc,
-        'zen': Zen,
-    }
-    
-    browser_class = browsers.get(browser_name)
+    browser_class = _BROWSERS.get(browser_name)
     if browser_class is None:
         raise ValueError(
             f"Invalid browser name: '{browser_name}'. "
-            f"Valid options: {', '.join(browsers.keys())}"
+            f"Valid options: {', '.join(_BROWSERS.keys())}"
         )
     return browser_class()
 
 class Base(object):
-    
+
+    # Seconds to subtract from the stored microsecond timestamp to reach
+    # the Unix epoch; Chromium-based browsers override with the WebKit
+    # offset, Firefox-based ones already store Unix microseconds
+    epoch_offset = 0
+
+    # DDL creating an index matching the history ORDER BY, for browsers
+    # whose database ships without one. Only applied to our private temp
+    # copy (SQLite offers no way to index a read-only database).
+    sort_index = None
+
+    # (table, key column) feeding the trigram search index, or None for
+    # browsers without one. The key column is spelled as it must appear
+    # in the history query's WHERE clause.
+    fts_source = None
+
+    # Read-only connection, opened lazily and kept for the lifetime of
+    # the browser object. The plugin runs one process per query, so this
+    # is NOT reused across keystrokes; it exists so the search-clause
+    # builder and query_history share one connection (and its attached
+    # trigram sidecar) within an invocation, and so the mid-write retry
+    # in query_history can swap in a snapshot connection.
+    _connection = None
+    _connection_mtime = None
+    _fts_ready = None
+
     def __del__(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except sqlite3.Error:
+                pass
         if hasattr(self, 'temp_path'):
             # Probably best we don't leave browser history in the temp directory
             # This deletes the temporary database file after the object is destroyed
@@ -56,32 +87,213 @@ class Base(object):
         Copies the database to a temporary location and returns the path to the
         copy.
         """
-        temp_dir = gettempdir()
-        temp_path = shutil.copy(database_path, temp_dir)
+        temp_path = os.path.join(gettempdir(), os.path.basename(database_path))
+        copied = False
+        if hasattr(os, 'copy_file_range'):
+            # In-kernel copy (and server-side clone on btrfs/NFS); skips
+            # shuttling the file through userspace buffers
+            try:
+                with open(database_path, 'rb') as src, open(temp_path, 'wb') as dst:
+                    while os.copy_file_range(src.fileno(), dst.fileno(), 1 << 30):
+                        pass
+                copied = True
+            except OSError:
+                pass  # Not supported across these filesystems; copy normally
+        if not copied:
+            shutil.copyfile(database_path, temp_path)
         self.temp_path = temp_path
         return temp_path
 
-    def query_history(self, database_path, query, limit=10):
+    def _open_readonly(self, database_path, force_copy=False):
         """
-        Query Browser history SQL Database.
+        Opens the history database in place, read-only, so no bytes are
+        copied. The immutable open takes no locks, so a query that lands
+        mid-write can fail at execute time; query_history retries such
+        failures here with force_copy to snapshot the file instead.
         """
-        # Copy the database to a temporary location.
-        temp_path = self._copy_database(database_path)
+        if force_copy:
+            connection = sqlite3.connect(self._copy_database(database_path), cached_statements=128)
+            self._writable_copy = True
+        else:
+            try:
+                connection = sqlite3.connect(
+                    f'file:{Path(database_path).as_posix()}?mode=ro&immutable=1&nolock=1',
+                    uri=True, cached_statements=128)
+                self._writable_copy = False
+            except sqlite3.OperationalError:
+                # Can't even open in place; query a copy instead.
+                connection = sqlite3.connect(self._copy_database(database_path), cached_statements=128)
+                self._writable_copy = True
+        # We only ever read, so trade durability settings for speed:
+        # in-memory temp tables, a ~20MB page cache and memory-mapped I/O
+        # keep the hot B-tree pages out of pread() syscalls. 512MB of mmap
+        # covers even multi-year history files entirely, so reads are
+        # straight page-cache hits with no memcpy into SQLite's buffers.
+        connection.executescript(
+            'PRAGMA query_only=1;'
+            'PRAGMA temp_store=MEMORY;'
+            'PRAGMA cache_size=-20000;'
+            'PRAGMA mmap_size=536870912;'
+            'PRAGMA case_sensitive_like=OFF;'
+        )
+        return connection
 
-        # Open the database.
-        connection = sqlite3.connect(temp_path)
-        
+    def _search_clause(self, needle):
+        """
+        Builds a WHERE clause and bind parameters matching the needle
+        against url and title, or an empty clause for no needle. LIKE
+        matches case-insensitively inside SQLite, so no lowercased copies
+        of the rows are ever allocated Python-side.
+        """
+        if not needle:
+            return '', ()
+        fts = self._fts_clause(needle)
+        if fts is not None:
+            return fts
+        return ' WHERE (url LIKE ? OR title LIKE ?)', (f'%{needle}%', f'%{needle}%')
+
+    def _fts_clause(self, needle):
+        """
+        Builds a WHERE clause against the trigram index, or returns None
+        when LIKE should be used instead (short needle, small history,
+        or no FTS5 trigram support in this SQLite).
+        """
+        if self.fts_source is None or len(needle) < FTS_MIN_NEEDLE:
+            return None
+        try:
+            connection = self._ensure_connection(self.database_path)
+        except OSError:
+            # Let the normal query path surface the missing database
+            return None
+        if self._fts_ready is None:
+            self._fts_ready = self._build_fts(connection)
+        if not self._fts_ready:
+            return None
+        table, key = self.fts_source
+        match = '"%s"' % needle.replace('"', '""')
+        return f' WHERE {key} IN (SELECT rowid FROM fts_db.fts WHERE fts MATCH ?)', (match,)
+
+    def _fts_index_path(self):
+        """Path of this browser's persisted trigram index"""
+        return FTS_INDEX_DIR / f'{type(self).__name__.lower()}.db'
+
+    def _attach_fts_index(self, connection):
+        """ATTACH the sidecar index database as fts_db"""
+        FTS_INDEX_DIR.mkdir(exist_ok=True)
+        connection.execute('ATTACH ? AS fts_db', (str(self._fts_index_path()),))
+
+    def _build_fts(self, connection):
+        """
+        Opens (building or refreshing if needed) the persisted trigram
+        index over the history, so substring search becomes an index
+        lookup instead of a full LIKE scan. The sidecar is keyed on the
+        history file's mtime and reused across invocations - the plugin
+        runs one process per query, so an index that only lived for one
+        connection would be rebuilt every keystroke. Returns whether the
+        index is usable; small histories aren't worth the build cost.
+        """
+        table, key = self.fts_source
+        try:
+            (count,) = connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()
+            if count < FTS_MIN_ROWS:
+                return False
+            self._attach_fts_index(connection)
+            if self._fts_index_fresh(connection):
+                return True
+            # Lift query_only while (re)building, as with the sort index
+            connection.execute('PRAGMA query_only=0')
+            try:
+                connection.execute('DROP TABLE IF EXISTS fts_db.fts')
+                connection.execute(
+                    "CREATE VIRTUAL TABLE fts_db.fts "
+                    "USING fts5(url, title, content='', tokenize='trigram')"
+                )
+                connection.execute(
+                    f'INSERT INTO fts_db.fts(rowid, url, title) SELECT {key}, url, title FROM {table}'
+                )
+                connection.execute('CREATE TABLE IF NOT EXISTS fts_db.meta (mtime REAL)')
+                connection.execute('DELETE FROM fts_db.meta')
+                connection.execute('INSERT INTO fts_db.meta VALUES (?)', (self._connection_mtime,))
+                connection.commit()
+            finally:
+                connection.execute('PRAGMA query_only=1')
+            return True
+        except sqlite3.DatabaseError as e:
+            log.debug(f"Trigram index unavailable for {table}: {e}")
+            return False
+
+    def _fts_index_fresh(self, connection):
+        """Whether the attached sidecar matches the current history file"""
+        tables = connection.execute(
+            "SELECT name FROM fts_db.sqlite_master WHERE name IN ('fts', 'meta')"
+        ).fetchall()
+        if len(tables) != 2:
+            return False
+        row = connection.execute('SELECT mtime FROM fts_db.meta').fetchone()
+        return row is not None and row[0] == self._connection_mtime
+
+    def _ensure_sort_index(self, connection, query, parameters, limit):
+        """
+        Creates the sort index on the temporary copy if the planner would
+        otherwise sort the whole table for the ORDER BY ... LIMIT query.
+        """
+        if self.sort_index is None or not getattr(self, '_writable_copy', False):
+            return
+        plan = connection.execute(
+            f'EXPLAIN QUERY PLAN {query} LIMIT ?', (*parameters, limit)
+        ).fetchall()
+        if any('USE TEMP B-TREE FOR ORDER BY' in row[-1] for row in plan):
+            # query_only was set at connect time; lift it just long enough
+            # to index our private copy
+            connection.executescript(
+                f'PRAGMA query_only=0; {self.sort_index}; PRAGMA query_only=1;'
+            )
+
+    def _ensure_connection(self, database_path):
+        """
+        Returns the long-lived connection, reopening it only when the
+        database file has changed on disk (an immutable open must not
+        outlive the file contents it was opened against).
+        """
+        mtime = os.path.getmtime(database_path)
+        if self._connection is not None and mtime == self._connection_mtime:
+            return self._connection
+        if self._connection is not None:
+            self._connection.close()
+        self._connection = self._open_readonly(database_path)
+        self._connection_mtime = mtime
+        self._fts_ready = None  # the trigram index died with the old connection
+        return self._connection
+
+    def query_history(self, database_path, query, limit=10, parameters=()):
+        """
+        Query Browser history SQL Database.
+        """
+        connection = self._ensure_connection(database_path)
         try:
             cursor = connection.cursor()
-            cursor.execute(f'{query} LIMIT {limit}')
-            recent = cursor.fetchall()
-            return recent
-        finally:
+            self._ensure_sort_index(connection, query, parameters, limit)
+            cursor.execute(f'{query} LIMIT ?', (*parameters, limit))
+            return cursor.fetchall()
+        except sqlite3.DatabaseError:
+            # The immutable open takes no locks, so the browser writing
+            # mid-read can surface here as a lock/corruption error.
+            # Retry once against a private snapshot of the file.
             connection.close()
+            self._connection = connection = self._open_readonly(database_path, force_copy=True)
+            if self._fts_ready:
+                # The query may reference the sidecar trigram index
+                self._attach_fts_index(connection)
+            cursor = connection.cursor()
+            self._ensure_sort_index(connection, query, parameters, limit)
+            cursor.execute(f'{query} LIMIT ?', (*parameters, limit))
+            return cursor.fetchall()
 
     def get_history_items(self, results):
         """
         Converts the tuple returned by the query to a HistoryItem object.
+        Rows are already filtered SQL-side, so every item built here is
+        rendered; nothing is constructed just to be discarded.
         """
         return [HistoryItem(self, *result) for result in results]
 
@@ -89,19 +301,27 @@ class Base(object):
 class Chrome(Base):
     """Google Chrome History"""
 
+    epoch_offset = CHROMIUM_EPOCH_OFFSET
+    sort_index = 'CREATE INDEX IF NOT EXISTS flow_last_visit_time ON urls(last_visit_time DESC)'
+    fts_source = ('urls', 'id')
+
     def __init__(self, database_path=CHROME_DIR):
         self.database_path = database_path
 
-    def history(self, limit=10):
+    def history(self, limit=10, needle=None):
         """
-        Returns a list of the most recently visited sites in Chrome's history.
+        Returns a list of the most recently visited sites in Chrome's history,
+        optionally filtered to those matching needle.
         """
-        recents = self.query_history(self.database_path, 'SELECT url, title, last_visit_time FROM urls ORDER BY last_visit_time DESC', limit)
+        where, parameters = self._search_clause(needle)
+        recents = self.query_history(self.database_path, f'SELECT url, title, last_visit_time FROM urls{where} ORDER BY last_visit_time DESC', limit, parameters)
         return self.get_history_items(recents)
 
 class Firefox(Base):
     """Firefox Browser History"""
 
+    fts_source = ('moz_places', 'moz_places.id')
+
     def __init__(self, database_path=FIREFOX_DIR):
         # Firefox database is not in a static location, so we need to find it
         self.database_path = self.find_database(database_path)
@@ -115,83 +335,123 @@ class Firefox(Base):
             '*.default',           # Older Firefox pattern
             '*Default Profile',    # Alternative default pattern
         ]
-        
+
+        # One scandir pass instead of one glob (and its stat calls) per
+        # pattern; entry names are matched in preference order afterwards.
+        # A missing profiles directory falls through to the descriptive
+        # error below, like the glob-based lookup did.
+        try:
+            with os.scandir(path) as entries:
+                names = [entry.name for entry in entries]
+        except FileNotFoundError:
+            names = []
         for pattern in patterns:
-            release_folder = next(Path(path).glob(pattern), None)
-            if release_folder:
-                return Path(path, release_folder, 'places.sqlite')
-        
+            for name in names:
+                if fnmatch.fnmatchcase(name, pattern):
+                    return Path(path, name, 'places.sqlite')
+
         # If no profile found, raise a more descriptive error
         raise FileNotFoundError(f"No Firefox/Zen profile found in {path}")
 
-    def history(self, limit=10):
-        """Most recent Firefox history"""
-        recents = self.query_history(self.database_path, 'SELECT url, title, visit_date FROM moz_places INNER JOIN moz_historyvisits on moz_historyvisits.place_id = moz_places.id ORDER BY visit_date DESC', limit)
+    def history(self, limit=10, needle=None):
+        """Most recent Firefox history, optionally filtered by needle"""
+        where, parameters = self._search_clause(needle)
+        recents = self.query_history(self.database_path, f'SELECT url, title, visit_date FROM moz_places INNER JOIN moz_historyvisits on moz_historyvisits.place_id = moz_places.id{where} ORDER BY visit_date DESC', limit, parameters)
         return self.get_history_items(recents)
 
 class Edge(Base):
     """Microsoft Edge History"""
 
+    epoch_offset = CHROMIUM_EPOCH_OFFSET
+    sort_index = 'CREATE INDEX IF NOT EXISTS flow_last_visit_time ON urls(last_visit_time DESC)'
+    fts_source = ('urls', 'id')
+
     def __init__(self, database_path=EDGE_DIR):
         self.database_path = database_path
 
-    def history(self, limit=10):
+    def history(self, limit=10, needle=None):
         """
-        Returns a list of the most recently visited sites in Chrome's history.
+        Returns a list of the most recently visited sites in Chrome's history,
+        optionally filtered to those matching needle.
         """
-        recents = self.query_history(self.database_path, 'SELECT url, title, last_visit_time FROM urls ORDER BY last_visit_time DESC', limit)
+        where, parameters = self._search_clause(needle)
+        recents = self.query_history(self.database_path, f'SELECT url, title, last_visit_time FROM urls{where} ORDER BY last_visit_time DESC', limit, parameters)
         return self.get_history_items(recents)
 
 class Brave(Base):
     """Brave Browser History"""
 
+    epoch_offset = CHROMIUM_EPOCH_OFFSET
+    sort_index = 'CREATE INDEX IF NOT EXISTS flow_last_visit_time ON urls(last_visit_time DESC)'
+    fts_source = ('urls', 'id')
+
     def __init__(self, database_path=BRAVE_DIR):
         self.database_path = database_path
 
-    def history(self, limit=10):
+    def history(self, limit=10, needle=None):
         """
-        Returns a list of the most recently visited sites in Brave's history.
+        Returns a list of the most recently visited sites in Brave's history,
+        optionally filtered to those matching needle.
         """
-        recents = self.query_history(self.database_path, 'SELECT url, title, last_visit_time FROM urls ORDER BY last_visit_time DESC', limit)
+        where, parameters = self._search_clause(needle)
+        recents = self.query_history(self.database_path, f'SELECT url, title, last_visit_time FROM urls{where} ORDER BY last_visit_time DESC', limit, parameters)
         return self.get_history_items(recents)
         
 class Opera(Base):
     """Opera Browser History"""
 
+    epoch_offset = CHROMIUM_EPOCH_OFFSET
+    sort_index = 'CREATE INDEX IF NOT EXISTS flow_last_visit_time ON urls(last_visit_time DESC)'
+    fts_source = ('urls', 'id')
+
     def __init__(self, database_path=OPERA_DIR):
         self.database_path = database_path
 
-    def history(self, limit=10):
+    def history(self, limit=10, needle=None):
         """
-        Returns a list of the most recently visited sites in Opera's history.
+        Returns a list of the most recently visited sites in Opera's history,
+        optionally filtered to those matching needle.
         """
-        recents = self.query_history(self.database_path, 'SELECT url, title, last_visit_time FROM urls ORDER BY last_visit_time DESC', limit)
+        where, parameters = self._search_clause(needle)
+        recents = self.query_history(self.database_path, f'SELECT url, title, last_visit_time FROM urls{where} ORDER BY last_visit_time DESC', limit, parameters)
         return self.get_history_items(recents)
 
 class Vivaldi(Base):
     """Vivaldi Browser History"""
 
+    epoch_offset = CHROMIUM_EPOCH_OFFSET
+    sort_index = 'CREATE INDEX IF NOT EXISTS flow_last_visit_time ON urls(last_visit_time DESC)'
+    fts_source = ('urls', 'id')
+
     def __init__(self, database_path=VIVALDI_DIR):
         self.database_path = database_path
 
-    def history(self, limit=10):
+    def history(self, limit=10, needle=None):
         """
-        Returns a list of the most recently visited sites in Vivaldi's history.
+        Returns a list of the most recently visited sites in Vivaldi's history,
+        optionally filtered to those matching needle.
         """
-        recents = self.query_history(self.database_path, 'SELECT url, title, last_visit_time FROM urls ORDER BY last_visit_time DESC', limit)
+        where, parameters = self._search_clause(needle)
+        recents = self.query_history(self.database_path, f'SELECT url, title, last_visit_time FROM urls{where} ORDER BY last_visit_time DESC', limit, parameters)
         return self.get_history_items(recents)
 
 class Arc(Base):
     """Arc Browser History"""
 
+    epoch_offset = CHROMIUM_EPOCH_OFFSET
+    sort_index = 'CREATE INDEX IF NOT EXISTS flow_last_visit_time ON urls(last_visit_time DESC)'
+    fts_source = ('urls', 'id')
+
     def __init__(self, database_path=ARC_DIR):
         self.database_path = database_path
 
-    def history(self, limit=10):
+    def history(self, limit=10, needle=None):
         """
-        Returns a list of the most recently visited sites in Arc's history.
+        Returns a list of the most recently visited sites in Arc's history,
+        optionally filtered to those matching needle.
         """
-        recents = self.query_history(self.database_path, 'SELECT url, title, last_visit_time FROM urls ORDER BY last_visit_time DESC', limit)
+        where, parameters = self._search_clause(needle)
+        recents = self.query_history(self.database_path, f'SELECT url, title, last_visit_time FROM urls{where} ORDER BY last_visit_time DESC', limit, parameters)
         return self.get_history_items(recents)
 
 class Zen(Firefox):
@@ -203,6 +463,10 @@ class Zen(Firefox):
 class HistoryItem(object):
     """Representation of a history item"""
 
+    # Slots instead of a per-item __dict__: a big history materializes
+    # thousands of these, and attribute access is on the hot filter path
+    __slots__ = ('browser', 'url', 'title', 'last_visit_time')
+
     def __init__(self, browser, url, title, last_visit_time):
         self.browser = browser
         self.url = url
@@ -214,16 +478,17 @@ class HistoryItem(object):
 
     def timestamp(self):
         """Convert browser-specific timestamp to Python datetime"""
-        # Chromium-based browsers use WebKit timestamp
-        chromium_browsers = (Chrome, Edge, Brave, Opera, Vivaldi, Arc)
-        # Firefox-based browsers use Unix timestamp in microseconds
-        firefox_browsers = (Firefox, Zen)
-        
-        if isinstance(self.browser, chromium_browsers):
-            return datetime((self.last_visit_time/1000000)-11644473600, 'unixepoch', 'localtime')
-        elif isinstance(self.browser, firefox_browsers):
-            return datetime.fromtimestamp(self.last_visit_time / 1000000.0)
-        else:
-            # Fallback for unknown browser types
-            log.warning(f"Unknown browser type: {type(self.browser).__name__}")
-            return datetime.fromtimestamp(self.last_visit_time / 1000000.0)
+        return datetime.fromtimestamp(self.last_visit_time / 1000000.0 - self.browser.epoch_offset)
+
+
+# Hoisted so dispatch doesn't rebuild the dict on every get() call
+_BROWSERS = {
+    'chrome': Chrome,
+    'firefox': Firefox,
+    'edge': Edge,
+    'brave': Brave,
+    'opera': Opera,
+    'vivaldi': Vivaldi,
+    'arc': Arc,
+    'zen': Zen,
+}
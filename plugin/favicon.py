@@ -1,10 +1,44 @@
+import os
+import shutil
+import time
 import urllib.request
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 import logging
 
 log = logging.getLogger(__name__)
 
+# How many favicon downloads may be in flight at once
+MAX_CONCURRENT_FETCHES = 16
+
+# Invalid filename characters, mapped away in a single translate() pass
+_SAFE_FILENAME = str.maketrans({':': '_', '/': '_', '\\': '_'})
+
+# How long a failed favicon fetch stays suppressed before being retried,
+# so a transient offline moment doesn't hide icons forever
+NEGATIVE_CACHE_TTL = 7 * 24 * 3600
+
+
+@lru_cache(maxsize=8192)
+def _get_domain(url):
+    """Extract domain from URL"""
+    try:
+        parsed = urllib.parse.urlparse(url)
+        domain = parsed.netloc or parsed.path.split('/')[0]
+        domain = domain.removeprefix('www.')
+        return domain
+    except (ValueError, AttributeError) as e:
+        log.error(f"Error parsing URL {url}: {e}")
+        return None
+
+
+@lru_cache(maxsize=8192)
+def _sanitize_filename(domain):
+    """Convert domain to safe filename"""
+    return domain.translate(_SAFE_FILENAME)
+
 class FaviconCache:
     """Cache for website favicons"""
     
@@ -18,36 +52,49 @@ class FaviconCache:
         
         self.cache_dir = cache_dir
         self.cache_dir.mkdir(exist_ok=True)
-        
-    def _get_domain(self, url):
-        """Extract domain from URL"""
-        try:
-            parsed = urllib.parse.urlparse(url)
-            domain = parsed.netloc or parsed.path.split('/')[0]
-            domain = domain.removeprefix('www.')
-            return domain
-        except (ValueError, AttributeError) as e:
-            log.error(f"Error parsing URL {url}: {e}")
-            return None
-    
-    def _sanitize_filename(self, domain):
-        """Convert domain to safe filename"""
-        # Replace invalid filename characters
-        return domain.replace(':', '_').replace('/', '_').replace('\\', '_')
-    
+
+        # Domains whose favicon could not be fetched, persisted as .404
+        # marker files so failures don't retry the network on every query;
+        # expired markers are dropped so the domain gets another chance
+        self._negative = set()
+        now = time.time()
+        for marker in self.cache_dir.glob('*.404'):
+            try:
+                if now - marker.stat().st_mtime < NEGATIVE_CACHE_TTL:
+                    self._negative.add(marker.stem)
+                else:
+                    marker.unlink()
+            except OSError:
+                pass
+
+        # URLs already resolved this session; spares a stat() per lookup
+        self._path_cache = {}
+
     def get_favicon_path(self, url):
         """Get favicon path for URL, downloading if necessary"""
-        domain = self._get_domain(url)
+        if url in self._path_cache:
+            return self._path_cache[url]
+        path = self._fetch_favicon_path(url)
+        self._path_cache[url] = path
+        return path
+
+    def _fetch_favicon_path(self, url):
+        """Look up the favicon on disk, downloading it on a cache miss"""
+        domain = _get_domain(url)
         if not domain:
             return None
-        
+
         # Check if favicon is already cached
-        safe_domain = self._sanitize_filename(domain)
+        safe_domain = _sanitize_filename(domain)
         favicon_path = Path(self.cache_dir, f"{safe_domain}.png")
-        
+
         if favicon_path.exists():
             return favicon_path.as_posix()
-        
+
+        # Don't retry domains that already failed
+        if safe_domain in self._negative:
+            return None
+
         # Try to download favicon
         try:
             # Try Google's favicon service first (most reliable)
@@ -60,25 +107,62 @@ class FaviconCache:
                 headers={'User-Agent': 'Mozilla/5.0'}
             )
             
+            # Stream straight to disk in 64KB chunks rather than holding
+            # the whole payload in memory
             with urllib.request.urlopen(req, timeout=2) as response:
-                favicon_data = response.read()
-                
-            # Save to cache
-            with open(favicon_path, 'wb') as f:
-                f.write(favicon_data)
-            
+                with open(favicon_path, 'wb') as f:
+                    shutil.copyfileobj(response, f, length=65536)
+
             log.info(f"Downloaded favicon for {domain}")
             return favicon_path.as_posix()
             
         except (urllib.error.URLError, OSError, IOError) as e:
             log.debug(f"Could not download favicon for {domain}: {e!r}")
+            # Don't leave a truncated icon behind to be read as cached
+            favicon_path.unlink(missing_ok=True)
+            # Remember the failure so this domain doesn't cost another
+            # 2 second timeout on the next keystroke
+            self._negative.add(safe_domain)
+            try:
+                Path(self.cache_dir, f"{safe_domain}.404").touch()
+            except OSError:
+                pass
             return None
     
+    def get_favicon_paths(self, urls):
+        """
+        Get favicon paths for many URLs at once, downloading any misses
+        concurrently so a page of uncached results costs one round-trip
+        instead of one per row. Favicons are cached per domain, so each
+        distinct domain is resolved exactly once no matter how many URLs
+        share it. Returns a dict of url -> path (or None).
+        """
+        if not urls:
+            return {}
+        # One representative URL per domain; the rest share its result
+        representatives = {}
+        for url in urls:
+            domain = _get_domain(url)
+            representatives.setdefault(domain, url)
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_FETCHES) as pool:
+            resolved = dict(zip(representatives.keys(),
+                                pool.map(self.get_favicon_path, representatives.values())))
+        paths = {}
+        for url in urls:
+            paths[url] = resolved[_get_domain(url)]
+            self._path_cache.setdefault(url, paths[url])
+        return paths
+
     def clear_cache(self):
-        """Clear all cached favicons"""
+        """Clear all cached favicons, including failure markers"""
         try:
-            for file in self.cache_dir.glob('*.png'):
-                file.unlink()
+            # scandir skips the per-entry stat that glob pays
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(('.png', '.404')):
+                        os.unlink(entry.path)
+            self._path_cache.clear()
+            self._negative.clear()
             log.info("Favicon cache cleared")
         except (OSError, PermissionError) as e:
             log.error(f"Error clearing favicon cache: {e}")
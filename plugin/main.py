@@ -1,3 +1,8 @@
+import json
+import os
+import time
+from pathlib import Path
+
 from flox import Flox, ICON_HISTORY, ICON_BROWSER
 
 import browsers
@@ -5,6 +10,12 @@ from favicon import FaviconCache
 
 HISTORY_GLYPH = ''
 DEFAULT_BROWSER = 'chrome'
+# How long a fetched history list may be reused between keystrokes.
+# Each keystroke runs in its own process, so the cache lives in a small
+# file rather than on the instance - in the plugin directory like the
+# favicon cache, not the temp directory, since it holds history rows.
+HISTORY_CACHE_TTL = 2.0
+HISTORY_CACHE_FILE = Path(__file__).parent.parent / 'history-cache.json'
 
 class BrowserHistory(Flox):
 
@@ -14,6 +25,46 @@ class BrowserHistory(Flox):
         self.browser = browsers.get(self.default_browser.lower())
         self.favicon_cache = FaviconCache()
 
+    def _recent_history(self, limit, needle=None):
+        """
+        Fetch history from the browser, reusing the previous invocation's
+        result while the database is unchanged and the cache is fresh.
+        Rapid successive keystrokes then share a single database query
+        even though each one runs in a fresh process.
+        """
+        try:
+            mtime = os.path.getmtime(self.browser.database_path)
+        except OSError:
+            mtime = None
+        key = [self.default_browser, mtime, limit, needle]
+        rows = self._read_history_cache(key)
+        if rows is not None:
+            return self.browser.get_history_items(rows)
+        history = self.browser.history(limit=limit, needle=needle)
+        self._write_history_cache(key, history)
+        return history
+
+    def _read_history_cache(self, key):
+        """Returns the cached rows for key, or None on any miss"""
+        try:
+            if time.time() - HISTORY_CACHE_FILE.stat().st_mtime >= HISTORY_CACHE_TTL:
+                return None
+            with open(HISTORY_CACHE_FILE) as f:
+                cached = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if cached.get('key') != key:
+            return None
+        return cached.get('rows')
+
+    def _write_history_cache(self, key, history):
+        rows = [[item.url, item.title, item.last_visit_time] for item in history]
+        try:
+            with open(HISTORY_CACHE_FILE, 'w') as f:
+                json.dump({'key': key, 'rows': rows}, f)
+        except OSError as e:
+            self.logger.debug(f"Could not write history cache: {e}")
+
     def _query(self, query):
         try:
             self.query(query)
@@ -25,57 +76,38 @@ class BrowserHistory(Flox):
         return self._results
 
     def query(self, query):
-        if not query or not query.strip():
+        query = query.strip() if query else ''
+        if not query:
             # If query is empty, just show the most recent history
             # Limit to 25 to ensure fast load times
-            history = self.browser.history(limit=25)
-            for idx, item in enumerate(history):
-                subtitle = f"{idx}. {item.url}"
-                
-                # Try to get favicon for the website
-                favicon_path = self.favicon_cache.get_favicon_path(item.url)
-                
-                # Use favicon if available, otherwise use default icon and glyph
-                if favicon_path:
-                    icon, glyph = favicon_path, None
-                else:
-                    icon, glyph = ICON_HISTORY, HISTORY_GLYPH
-                
-                self.add_item(
-                    title=item.title,
-                    subtitle=subtitle,
-                    icon=icon,
-                    glyph=glyph,
-                    method=self.browser_open,
-                    parameters=[item.url],
-                    context=[item.title, item.url]
-                )
+            history = self._recent_history(limit=25)
         else:
-            # If query is not empty, search through history
-            history = self.browser.history(limit=10000)
-            query_lower = query.lower()
-            for idx, item in enumerate(history):
-                if query_lower in item.title.lower() or query_lower in item.url.lower():
-                    subtitle = f"{idx}. {item.url}"
-                    
-                    # Try to get favicon for the website
-                    favicon_path = self.favicon_cache.get_favicon_path(item.url)
-                    
-                    # Use favicon if available, otherwise use default icon and glyph
-                    if favicon_path:
-                        icon, glyph = favicon_path, None
-                    else:
-                        icon, glyph = ICON_HISTORY, HISTORY_GLYPH
-                    
-                    self.add_item(
-                        title=item.title,
-                        subtitle=subtitle,
-                        icon=icon,
-                        glyph=glyph,
-                        method=self.browser_open,
-                        parameters=[item.url],
-                        context=[item.title, item.url]
-                    )
+            # If query is not empty, let SQLite do the matching so only
+            # hits are materialized
+            history = self._recent_history(limit=10000, needle=query)
+        # Resolve all favicons up front so uncached ones download
+        # concurrently instead of blocking the loop one by one
+        favicons = self.favicon_cache.get_favicon_paths([item.url for item in history])
+        for idx, item in enumerate(history):
+            subtitle = f"{idx}. {item.url}"
+
+            favicon_path = favicons.get(item.url)
+
+            # Use favicon if available, otherwise use default icon and glyph
+            if favicon_path:
+                icon, glyph = favicon_path, None
+            else:
+                icon, glyph = ICON_HISTORY, HISTORY_GLYPH
+
+            self.add_item(
+                title=item.title,
+                subtitle=subtitle,
+                icon=icon,
+                glyph=glyph,
+                method=self.browser_open,
+                parameters=[item.url],
+                context=[item.title, item.url]
+            )
 
     def context_menu(self, data):
         self.add_item(